@@ -0,0 +1,23 @@
+var active = {}
+for (var index = 0; index < checkbox.active.length; index++) {
+    active[checkbox.active[index]] = true
+}
+if (!source._full) {  // keep all the rows on first use, instead of a second source in the page
+    source._full = source.data
+}
+var full = source._full
+var columns = Object.keys(full)
+var data = {}
+for (var c = 0; c < columns.length; c++) {
+    data[columns[c]] = []
+}
+var groups = full['group']
+for (var row = 0; row < groups.length; row++) {
+    if (active[groups[row]]) {
+        for (var c = 0; c < columns.length; c++) {
+            data[columns[c]].push(full[columns[c]][row])
+        }
+    }
+}
+source.data = data
+source.change.emit()
@@ -0,0 +1,10 @@
+if (button.clicks % 2 == 1) {
+    checkbox.active = []
+}
+else {
+    var all = []
+    for (var index = 0; index < checkbox.labels.length; index++) {
+        all.push(index)
+    }
+    checkbox.active = all
+}
@@ -0,0 +1,8 @@
+var visible = {}
+for (var index = 0; index < checkbox.active.length; index++) {
+    visible[checkbox.active[index]] = true
+}
+var lines = checkbox.callback.args
+for (var index = 0; index < checkbox.labels.length; index++) {
+    lines['l' + index].visible = index in visible
+}
@@ -0,0 +1,184 @@
+"""Benchmark DataPlot and BokehPlot on synthetic datasets.
+
+Run as: python -m mLearning.benchmark --output results.json
+Each stage is timed and its peak Python memory measured with tracemalloc;
+results are written as JSON to compare versions, with the cold import time
+of the package."""
+import numpy as np
+import pandas as pd
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import sys
+import tracemalloc
+from datetime import datetime
+from os import environ, pathsep
+from os.path import dirname, join as osjoin
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+__all__ = ('synthetic_data', 'measure', 'cold_import', 'run_benchmark')
+
+
+SCALES = [(10000, 10, 4), (100000, 50, 6), (1000000, 200, 8)]  # rows, groups, numeric columns
+YEARS = (1990, 2017)
+PLOTS = [('boxplot_all_quartiles', {}),
+         ('boxplot_all_quartiles', {'summary': True}),
+         ('parallel_coordinates_graph', {}),
+         ('heatmap_pearson_correlation', {}),
+         ('cross_plotting_pair_of_attributes', {'firstCol': 'c0', 'secondCol': 'c1'}),
+         ('plot_target_correlation', {'col': 'c0'})]
+IMPORT_MODULE = 'mLearning.dataPlot'
+IMPORT_RUNS = 5
+HEAVY_MODULES = ['bokeh', 'pathos', 'dill', 'matplotlib']  # should only load when used
+IMPORT_CODE = """import sys, json
+from time import perf_counter
+start = perf_counter()
+import {module}
+seconds = perf_counter() - start
+print(json.dumps([seconds, sorted(set(m.split('.')[0] for m in sys.modules) & set({heavy!r}))]))"""
+
+
+def _letters(number):
+    """Write number in base 26 with letters, eg. 0 as A, 26 as BA, not public."""
+
+    letters = ''
+    while True:
+        number, digit = divmod(number, 26)
+        letters = chr(ord('A') + digit) + letters
+        if not number:
+            return letters
+
+
+def synthetic_data(rows, groups, columns, years=YEARS, seed=0):
+    """Return a raw frame shaped like our exports: name, year, month, values.
+
+    Names are made of letters only, as cleaning drops digits, and each of
+    the groups has at least one row."""
+
+    assert 2 <= columns <= 11, 'transposed plots need 2 to 11 numeric columns'
+    assert groups <= rows, 'every group needs a row'
+    rng = np.random.RandomState(seed)
+    names = np.array(['Commodity {}, fresh'.format(_letters(i)) for i in range(groups)], dtype=object)
+    data = pd.DataFrame({'name': names[rng.permutation(np.arange(rows) % groups)],
+                         'year': rng.randint(years[0], years[1] + 1, rows),
+                         'month': rng.randint(1, 13, rows)},
+                        columns=['name', 'year', 'month'])
+    for i in range(columns):
+        data['c{}'.format(i)] = rng.lognormal(i, 1, rows)
+    return data
+
+
+def measure(function, *args, **kwargs):
+    """Return (seconds, peak traced bytes, result) of one call."""
+
+    tracemalloc.start()
+    start = perf_counter()
+    try:
+        result = function(*args, **kwargs)
+        seconds = perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return seconds, peak, result
+
+
+def cold_import(module=IMPORT_MODULE, runs=IMPORT_RUNS):
+    """Import module in fresh interpreters, return its fastest import time.
+
+    Also return the heavy modules loaded by the import, which should be
+    none: they are imported by the features using them."""
+
+    code = IMPORT_CODE.format(module=module, heavy=HEAVY_MODULES)
+    environment = dict(environ, PYTHONPATH=pathsep.join(p for p in sys.path if p))
+    times = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', code], env=environment)
+        seconds, loaded = json.loads(output.decode().splitlines()[-1])
+        times.append(seconds)
+    return {'stage': 'import', 'module': module, 'seconds': min(times), 'runs': runs, 'loaded': loaded}
+
+
+def _environment():
+    """Describe the code and libraries measured, not public."""
+
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=dirname(__file__) or '.',
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    versions = {}
+    for module in ['numpy', 'pandas', 'bokeh']:
+        try:
+            versions[module] = getattr(__import__(module), '__version__', None)
+        except ImportError:
+            versions[module] = None
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'versions': versions, 'date': datetime.utcnow().isoformat()}
+
+
+def run_benchmark(scales=SCALES, workers=None):
+    """Time every stage at each scale, return a JSON-serializable dict."""
+
+    from mLearning.dataPlot import DataPlot  # after logging is configured by the caller
+
+    results = [cold_import()]
+    for rows, groups, columns in scales:
+        scale = {'rows': rows, 'groups': groups, 'columns': columns}
+
+        def record(stage, function, *args, **kwargs):
+            try:
+                seconds, peak, result = measure(function, *args, **kwargs)
+            except Exception as error:  # keep measuring the other stages
+                results.append(dict(scale, stage=stage, error=repr(error)))
+                logging.warning('%s failed: %r', stage, error)
+                return None
+            results.append(dict(scale, stage=stage, seconds=seconds, peakBytes=peak))
+            return result
+
+        with TemporaryDirectory() as folder:
+            dataFile = osjoin(folder, 'synthetic.csv')
+            synthetic_data(rows, groups, columns).to_csv(dataFile, index=False)
+
+            plots = record('load', DataPlot, 'synthetic', dataFile, False)
+            if plots is None:
+                continue
+            assert len(plots.groupIndex) == groups, 'synthetic names cleaned into {} groups, not {}'.format(
+                len(plots.groupIndex), groups)
+            record('normalize_data', plots.normalize_data)
+            record('denormalize_data', plots.denormalize_data)
+
+            for method, kwargs in PLOTS:
+                stage = method + (':summary' if kwargs.get('summary') else '')
+                fig = record(stage, getattr(plots, method), **kwargs)
+                if fig is not None:
+                    html = record('render:' + stage, fig.render)
+                    if html is not None:
+                        results[-1]['bytes'] = len(html)
+
+            record('transpose_index', plots.transpose_index, workers=workers)
+            record('transposed_document', plots.transposed_document)
+
+    return {'environment': _environment(), 'results': results}
+
+
+def _scale(text):
+    """Parse ROWSxGROUPSxCOLUMNS, not public."""
+    return tuple(int(n) for n in text.split('x'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default='benchmark.json', help='JSON file to write')
+    parser.add_argument('--scale', type=_scale, action='append',
+                        help='ROWSxGROUPSxCOLUMNS, may be repeated')
+    parser.add_argument('--workers', type=int, help='processes used by transpose_index')
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format=' %(asctime)s - %(levelname)s - %(message)s')
+    report = run_benchmark(arguments.scale or SCALES, arguments.workers)
+    with open(arguments.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    print('{} measures written to {}'.format(len(report['results']), arguments.output))
@@ -1,15 +1,15 @@
-"""Helper module to build Bokeh plots."""
-from bokeh.plotting import figure, output_file, show, save
-from bokeh.models import CustomJS, CheckboxGroup
-from bokeh.layouts import row, widgetbox
-from bokeh import charts
-from bokeh.models.widgets import Button
+"""Helper module to build Bokeh plots.
+
+Bokeh is imported by the methods using it, so importing this module, eg.
+in worker processes, does not load it."""
 import logging
-from os import getcwd
-from os.path import join as osjoin
+from os.path import abspath, dirname, join as osjoin
+import hashlib
+import numpy as np
+from mLearning.downsample import lttb_indices, minmax_indices, spread_indices
+from mLearning.renderCache import content_key
+from mLearning.instrumentation import stage
 
-logging.basicConfig(
-    level=logging.DEBUG, format=' %(asctime)s - %(levelname)s - %(message)s')
 
 __all__ = ('BokehPlot')
 
@@ -18,26 +18,66 @@ BOKEH_TYPE = 'bokehType'
 MINIMUM_GRAPH_PROPERTIES = ['x', 'y', BOKEH_TYPE]
 LINE_NAME_PATTERN = '\w\d+'
 SAVE_FOLDER = 'BokehHTML/'
+DOWNSAMPLING = {'lttb': lttb_indices, 'minmax': minmax_indices}
+MIN_LINE_POINTS = 2  # first and last points
+GROUP_COLUMN = 'group'
+BATCH_LAYOUTS = ['tabs', 'column']
+JS_FOLDER = dirname(abspath(__file__))
+XY_GLYPHS = ['line', 'circle', 'scatter', 'square', 'triangle', 'diamond', 'cross', 'x', 'asterisk']
+
+
+def _as_array(values):
+    """Return values as a NumPy array, with dates as datetime64, not public."""
+
+    values = np.asarray(values)
+    if values.dtype == object:  # eg. a list of pandas Timestamps
+        try:
+            values = values.astype('datetime64[ns]')
+        except (TypeError, ValueError):
+            pass
+    return values
+
+
+def _read_JS(fileName):
+    """Return the JavaScript code of a file next to this module, not public."""
+
+    with open(osjoin(JS_FOLDER, fileName), 'r') as fileJS:
+        return fileJS.read()
 
 
 class BokehPlot(object):
     """Helper class to generate Bokeh plots."""
     logging.debug('BokehPlot class instantiated.')
 
-    def __init__(self, plotName, lines, figProp={}, interactive=False):
-        """Initialize BokehPlot."""
+    def __init__(self, plotName, lines, figProp={}, interactive=False, maxPoints=None, downsampling='lttb',
+                 groups=None, cache=None):
+        """Initialize BokehPlot.
+
+        maxPoints caps the points drawn by line and multi_line glyphs over
+        the whole figure; downsampling names the method used for lines.
+        groups labels the integer GROUP_COLUMN of a single data line: the
+        interactive figure then shows/hides rows of that line by group.
+        cache is an optional RenderCache used by render()."""
         self.plotName, self.lines = plotName, lines
         assert isinstance(plotName, str), 'plotName is not a string'
         assert isinstance(lines, dict), 'lines is not a dictionary'
-        self.fig = figure(**figProp)
+        assert downsampling in DOWNSAMPLING, 'unknown downsampling: {}'.format(downsampling)
+        self.figProp, self.fig = figProp, None  # the figure is created when plotted
         self.interactive = interactive
+        self.maxPoints, self.downsampling = maxPoints, downsampling
+        self.groups, self.cache = groups, cache
+        self.model, self.html = None, None  # built and rendered once
 
     def plot_figure(self):
         """Construct the figure."""
+        from bokeh.plotting import figure
+        from bokeh.models import ColumnDataSource
 
-        output_file('BokehHTML/' + self.plotName + '.html', title=self.plotName)
-        lines, index = {}, 0
+        self.fig = figure(**self.figProp)
+        lines, index, self.sources = {}, 0, {}
+        budget = self.line_budget()
         for lineName, line in self.lines.items():
+            line = dict(line)  # properties are popped below, self.lines keys the render cache
             if 'data' in line.keys():
                 assert BOKEH_TYPE in line.keys(), 'missing property: {}, properties: {}'.format(BOKEH_TYPE, line.keys())
                 graphData = line.pop('data')
@@ -50,12 +90,15 @@ class BokehPlot(object):
                         methodName = line.pop(BOKEH_TYPE)
                     else:
                         graphData.append(line.pop(prop))
+                if budget:
+                    graphData = self._downsample(methodName, graphData, budget)
 
             error = False
             try:
                 method = getattr(self.fig, methodName)
             except AttributeError:
                 error = self.fig.__class__.__name__
+                from bokeh import charts  # slow to import, only for chart types
                 try:
                     method = getattr(charts, methodName)
                 except AttributeError:
@@ -64,7 +107,16 @@ class BokehPlot(object):
                     error = False
                     self.fig = method(graphData, **line)
             else:
-                lines[lineName] = method(*graphData, **line)
+                if not isinstance(graphData, list):  # line properties name columns of the data
+                    lines[lineName] = method(source=ColumnDataSource(graphData), **line)
+                elif methodName == 'multi_line':
+                    source = ColumnDataSource(dict(xs=graphData[0], ys=graphData[1]))
+                    lines[lineName] = method(xs='xs', ys='ys', source=source, **line)
+                elif methodName in XY_GLYPHS:
+                    xName, yName, source = self._add_columns(index, *graphData)
+                    lines[lineName] = method(x=xName, y=yName, source=source, **line)
+                else:
+                    lines[lineName] = method(*graphData, **line)
 
             if error:
                 raise NotImplementedError("Class '{}' does not implement '{}'".format(error, methodName))
@@ -73,34 +125,74 @@ class BokehPlot(object):
         logging.debug('Figure plotted')
         return lines
 
-    def _visible_line_JS(self, line):
-        """Generate JavaScript code for Bokeh client side, not public.
+    def line_budget(self):
+        """Return the points each line may keep, or None without maxPoints.
+
+        maxPoints is shared by the lines, with at least MIN_LINE_POINTS per
+        line: the total never exceeds max(maxPoints, MIN_LINE_POINTS * lines)."""
+
+        if not self.maxPoints:
+            return None
+        return max(self.maxPoints // max(len(self.lines), 1), MIN_LINE_POINTS)
+
+    def _downsample(self, methodName, graphData, budget):
+        """Reduce line data to at most budget points, not public."""
 
-        Toggle visibility of individual line."""
-        # logging.debug('Generating JavaScript to toggle line visibility...')  # Optional -- too many prints
+        x, y = graphData
+        with stage('downsample', plot=self.plotName, points=len(y)) as timer:
+            if methodName == 'line' and len(y) > budget:
+                kept = DOWNSAMPLING[self.downsampling](x, y, budget)
+            elif methodName == 'multi_line' and len(y) and len(y) * len(y[0]) > budget:
+                if budget < len(y[0]):  # a single polyline, with evenly spread points
+                    points = spread_indices(len(y[0]), budget)
+                    timer.add(kept=len(points))
+                    logging.debug('%s polylines reduced to one of %s points', len(y), len(points))
+                    return [[_as_array(x[0])[points]], [_as_array(y[0])[points]]]
+                kept = spread_indices(len(y), budget // len(y[0]))  # keep whole polylines
+            else:
+                return graphData
+            timer.add(kept=len(kept))
+
+        logging.debug('%s points downsampled to %s', len(y), len(kept))
+        if methodName == 'line':
+            return [_as_array(x)[kept], _as_array(y)[kept]]
+        return [[x[i] for i in kept], [y[i] for i in kept]]
+
+    def _add_columns(self, index, x, y):
+        """Add x, y to the figure source sharing the same x, not public.
 
-        return """if ({0} in checkbox.active) {{
-        {1}.visible = true
-        }} else {{
-        {1}.visible = false}}""".format(int(line[1:]), line)
-        logging.debug('JavaScript generated')
+        Lines with identical x values share one ColumnDataSource, so the x
+        column, eg. dates, is stored and serialized only once."""
+        from bokeh.models import ColumnDataSource
+
+        x, y = _as_array(x), _as_array(y)
+        key = (str(x.dtype), hashlib.sha1(x.tobytes()).hexdigest())
+        if key not in self.sources:
+            xName = 'x{}'.format(len(self.sources))
+            self.sources[key] = (xName, ColumnDataSource({xName: x}))
+        xName, source = self.sources[key]
+
+        yName = 'y{}'.format(index)
+        source.add(y, yName)
+        return xName, yName, source
 
     def interactive_figure(self):
         """Add interactivity, ie. the option to show/hide lines to the figure."""
+        from bokeh.models import CustomJS, CheckboxGroup
+        from bokeh.models.widgets import Button
+        from bokeh.layouts import row, widgetbox
+
+        if self.groups is not None:
+            return self._group_filter_figure()
 
         lines = self.plot_figure()  # Generates a list of lines
         labels = [line for line in lines.keys()]  # Prepare a list of labels for the tickboxes
-        lineNames = ['l'+str(x) for x in range(len(lines))]  # Prepare a list of names for the lines
+        lineNames = ['l'+str(x) for x in range(len(lines))]  # Line names, looked up by index in JavaScript
         lines = {k: v for k, v in zip(lineNames, lines.values())}  # Create a dictionary {name: line}
         activeL = list(range(len(lines)))  # List of all line index to mark them as active in CheckboxGroup
 
-        JScode = [self._visible_line_JS(k) for k in lines]  # Generate JavaScript for each line
-        JScode = '\n'.join(JScode)  # From a list to a single string
-
-        with open(osjoin(getcwd(), 'mLearning', 'JScodeAllLines.js'), 'r') as fileJS:
-            buttonJS = fileJS.read()  # Read JavaScript code from a file to toggle the visibility of all lines
-        # with open(osjoin(getcwd(), 'mLearning', 'JScode.js'), 'w+') as codeFile:
-        #     codeFile.write(JScode)  # Write whole CustomJS to a file for debugging purposes
+        JScode = _read_JS('JScodeToggleLines.js')  # Same code whatever the number of lines
+        buttonJS = _read_JS('JScodeSelectAll.js') + JScode  # Toggle all lines, then apply
 
         callback = CustomJS(code=JScode, args={})  # Args will be added once checkbox and button are added to lines
         checkbox = CheckboxGroup(labels=labels,
@@ -121,35 +213,153 @@ class BokehPlot(object):
         logging.debug('Interaction implemented')
         return layout
 
+    def _group_filter_figure(self):
+        """Add checkboxes filtering the rows of a single line by group, not public.
+
+        The JavaScript is the same whatever the number of groups: it copies
+        the rows of the active groups from the columns the source had when
+        first filtered, so the rows are only held once in the page."""
+        from bokeh.models import CustomJS, CheckboxGroup
+        from bokeh.models.widgets import Button
+        from bokeh.layouts import row, widgetbox
+
+        lines = self.plot_figure()
+        assert len(lines) == 1, 'groups need a single line, got {}'.format(len(lines))
+        source = list(lines.values())[0].data_source
+        assert GROUP_COLUMN in source.data, 'missing column: "{}"'.format(GROUP_COLUMN)
+
+        checkbox = CheckboxGroup(labels=list(self.groups),
+                                 active=list(range(len(self.groups))),
+                                 name='checkbox')
+        button = Button(label="Select/Unselect All", button_type="default", name='button')
+        args = dict(checkbox=checkbox, button=button, source=source)
+        filterJS = _read_JS('JScodeFilterGroups.js')
+        checkbox.callback = CustomJS(code=filterJS, args=args)
+        button.callback = CustomJS(code=_read_JS('JScodeSelectAll.js') + filterJS, args=args)
+        layout = row(self.fig, widgetbox(children=[button, checkbox], width=200))
+
+        logging.debug('Group filter implemented')
+        return layout
+
+    def build(self):
+        """Build the Bokeh model once: the figure, or its interactive layout."""
+
+        if self.model is None:
+            with stage('build_figure', plot=self.plotName):
+                if self.interactive:
+                    self.model = self.interactive_figure()
+                else:
+                    self.plot_figure()
+                    self.model = self.fig
+            logging.debug('Model built')
+        return self.model
+
     def document(self):
         """Return a Bokeh document object to be rendered."""
+        return self.build()
+
+    def cache_key(self):
+        """Return the render cache key, a hash of the plot inputs."""
+        return content_key(self.plotName, self.lines, self.figProp, self.interactive,
+                           self.maxPoints, self.downsampling, self.groups)
+
+    def render(self):
+        """Return the figure as standalone HTML, rendered once.
+
+        With a cache, the key is computed from the plot inputs before Bokeh
+        is used, so unchanged plots are served without building the figure."""
+        from bokeh.embed import file_html
+        from bokeh.resources import CDN
+
+        if self.html is not None:
+            return self.html
+
+        key = None
+        if self.cache is not None:
+            key = self.cache_key()
+            self.html = self.cache.get(key)
+
+        if self.html is None:
+            model = self.build()
+            with stage('serialize', plot=self.plotName) as timer:
+                self.html = file_html(model, CDN, title=self.plotName)
+                timer.add(bytes=len(self.html))
+            if key is not None:
+                self.cache.put(key, self.html)
+        else:
+            logging.debug('Rendered figure served from cache')
+        return self.html
+
+    @staticmethod
+    def batch_model(plots, layout='tabs'):
+        """Return one Bokeh model holding the models of many plots.
 
-        if self.interactive:
-            interactive_figure = self.interactive_figure()
-            save(interactive_figure, filename=SAVE_FOLDER + self.plotName)
-            logging.debug('Interactive document returned')
-            return interactive_figure
+        layout is 'tabs', one tab per plot, or 'column', plots stacked."""
+        from bokeh.models.widgets import Panel, Tabs
+        from bokeh.layouts import column
+
+        assert layout in BATCH_LAYOUTS, 'unknown layout: {}'.format(layout)
+        models = [plot.build() for plot in plots]
+        if layout == 'tabs':
+            return Tabs(tabs=[Panel(child=model, title=plot.plotName) for plot, model in zip(plots, models)])
+        return column(*models)
+
+    @staticmethod
+    def render_batch(plots, title, layout='tabs'):
+        """Render many plots as a single HTML page sharing one set of resources."""
+        from bokeh.embed import file_html
+        from bokeh.resources import CDN
+
+        model = BokehPlot.batch_model(plots, layout)
+        with stage('serialize', plot=title, plots=len(plots)) as timer:
+            html = file_html(model, CDN, title=title)
+            timer.add(bytes=len(html))
+        logging.debug('%s figures rendered in one document', len(plots))
+        return html
+
+    @staticmethod
+    def components_batch(plots):
+        """Return one script and one div per plot, to embed many plots at once.
+
+        The divs are keyed by plot name; the script and the Bokeh resources
+        are shared by all the plots."""
+        from bokeh.embed import components
+
+        models = {plot.plotName: plot.build() for plot in plots}
+        with stage('serialize', plot='components', plots=len(plots)) as timer:
+            script, divs = components(models)
+            timer.add(bytes=len(script) + sum(len(div) for div in divs.values()))
+        logging.debug('%s figures serialized together', len(plots))
+        return script, divs
+
+    def persist(self, folder=SAVE_FOLDER, writer=None):
+        """Write the rendered HTML to folder, through writer if given.
+
+        writer only needs a write(path, html) method, eg. an ExportWriter
+        writing in the background."""
+
+        path = osjoin(folder, self.plotName + '.html')
+        html = self.render()
+        if writer is not None:
+            writer.write(path, html)
         else:
-            self.plot_figure()
-            save(obj=self.fig, filename=SAVE_FOLDER + self.plotName)
-            logging.debug('Document returned')
-            return self.fig
+            with stage('write', path=path, bytes=len(html)), open(path, 'w') as page:
+                page.write(html)
+
+        logging.debug('Figure persisted')
+        return path
 
     def show(self):
         """Show the figure in the browser (works locally)."""
+        from bokeh.plotting import output_file, show
 
         logging.debug('Showing figure...')
-        show(self.document())
+        output_file(osjoin(SAVE_FOLDER, self.plotName + '.html'), title=self.plotName)
+        show(self.build())
         logging.debug('Figure shown')
 
     def save(self):
         """Save the figure at the specified location."""
 
-        if self.interactive:
-            interactive_figure = self.interactive_figure()
-            save(interactive_figure, filename=SAVE_FOLDER + self.plotName)
-        else:
-            self.plot_figure()
-            save(obj=self.fig, filename=SAVE_FOLDER + self.plotName)
-
+        self.persist()
         logging.debug('Figure saved')
@@ -0,0 +1,73 @@
+"""Columnar on-disk cache of cleaned DataPlot frames."""
+import hashlib
+import logging
+from importlib.util import find_spec
+from os import makedirs, stat
+from os.path import abspath, exists, join as osjoin
+
+__all__ = ('DataCache')
+
+
+CACHE_FOLDER = 'DataCache/'
+HASH_BLOCK_SIZE = 2 ** 20
+CACHE_PARTS = ['data', 'numeric', 'description']
+
+
+class DataCache(object):
+    """Store cleaned frames as Feather files, memory-mapped when loaded."""
+
+    def __init__(self, folder=CACHE_FOLDER):
+        """Initialize DataCache."""
+        if find_spec('pyarrow') is None:  # pyarrow is only needed, and imported, when a cache is used
+            raise ImportError('pyarrow is required to cache DataPlot frames')
+        self.folder = folder
+        if not exists(folder):
+            makedirs(folder)
+
+    def key(self, dataFile):
+        """Return a key from the path, mtime, size and content of dataFile."""
+
+        path = abspath(dataFile)
+        info = stat(path)
+        digest = hashlib.sha1()
+        digest.update('{}|{}|{}'.format(path, info.st_mtime, info.st_size).encode())
+        with open(path, 'rb') as dataHandle:
+            for block in iter(lambda: dataHandle.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+
+        return digest.hexdigest()
+
+    def _path(self, key, part):
+        """Return the file path of a cached part, not public."""
+        return osjoin(self.folder, '{}.{}.feather'.format(key, part))
+
+    def load(self, key):
+        """Return (data, numericData, description) or None if not cached."""
+        import pyarrow.feather as feather
+
+        paths = [self._path(key, part) for part in CACHE_PARTS]
+        if not all(exists(path) for path in paths):
+            logging.debug('Cache miss: %s', key)
+            return None
+
+        data, numericData, description = [
+            feather.read_table(path, memory_map=True).to_pandas() for path in paths]
+        data = data.set_index(data.columns[0])
+        numericData.index = data.index
+        description = description.set_index(description.columns[0])
+        description.index.name = None
+
+        logging.debug('Cache hit: %s', key)
+        return data, numericData, description
+
+    def store(self, key, data, numericData, description):
+        """Write the cleaned frame, its numeric subset and its description."""
+        import pyarrow.feather as feather
+
+        frames = [data.reset_index(), numericData.reset_index(drop=True),
+                  description.reset_index()]
+        for frame, part in zip(frames, CACHE_PARTS):
+            frame.columns = [str(c) for c in frame.columns]
+            feather.write_feather(frame, self._path(key, part))
+
+        logging.debug('Data cached: %s', key)
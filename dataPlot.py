@@ -1,136 +1,384 @@
 """Advanced visualization of attributes."""
+import numpy as np
 import pandas as pd
-from bokeh.palettes import brewer, Inferno9
-from random import uniform
-import matplotlib.colors as colors
-import matplotlib.cm as cmax
-from mLearning.bokehPlot import BokehPlot
+from mLearning.bokehPlot import BokehPlot, GROUP_COLUMN
+from mLearning.downsample import spread_indices
+from mLearning.runningStats import RunningStatistics, RunningCorrelation
+from mLearning.dataCache import DataCache
+from mLearning.groupIndex import GroupIndex
+from mLearning.plotExport import ExportWriter
+from mLearning.instrumentation import stage
 # from bokehPlot import BokehPlot
 import logging
-from time import clock
-from bokeh.embed import file_html
-from bokeh.resources import CDN
-import dill
-from pathos.multiprocessing import ProcessingPool
+from functools import wraps
+import re
+from os.path import join as osjoin
+import sys
+from time import perf_counter
 
 __all__ = ('DataPlot')
 
-logging.basicConfig(
-    level=logging.DEBUG, format=' %(asctime)s - %(levelname)s - %(message)s')
-
-
 # TODO run test on other datasets
 # TODO add more assertion and try/except clauses
-# TODO TODO get rid of matplotlib dependancy
 
 DATA_INDEX = 'name'
+NUMERIC_DTYPES = ['float64', 'float32']
+COMPACT_DECIMALS = 6  # most decimals of a column downcast to float32
+NAME_PATTERN = re.compile('([^A-zÀ-ÿ]+|[À-ÿ$]+)')  # anything but unaccented letters
+CORRELATION_CHUNK = 100000  # rows per chunk when accumulating correlations
+MAX_OUTLIERS = 1000  # outliers drawn per summary box plot
+YEAR_RANGE = (1678, 2261)  # years held by datetime64[ns]
+
+
+def memoized(method):
+    """Cache what a DataPlot method returns until its data changes.
+
+    Results are kept in the instance's _memo, keyed by method and arguments;
+    set_current_data and append empty it."""
+
+    @wraps(method)
+    def memoizedMethod(self, *args, **kwargs):
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        if key not in self._memo:
+            self._memo[key] = method(self, *args, **kwargs)
+        return self._memo[key]
+
+    return memoizedMethod
+
+
+def _decimals(values):
+    """Return the decimals values are written with, None above COMPACT_DECIMALS, not public."""
+
+    finite = values[np.isfinite(values)]
+    for decimals in range(COMPACT_DECIMALS + 1):
+        if np.all(np.abs(np.round(finite, decimals) - finite) <= 4 * np.spacing(np.abs(finite))):
+            return decimals
+    return None
 
 
 class DataPlot():
     """Child class from dataStatistics to plot interesting data."""
     logging.debug('DataPlot class instantiated.')
 
-    def __init__(self, tableName, dataFile, normalized):
-        """Initialize DataPlot."""
+    def __init__(self, tableName, dataFile, normalized, chunkSize=None, cacheFolder=None, renderCache=None,
+                 compact=False):
+        """Initialize DataPlot.
+
+        With chunkSize, the data file is read and cleaned chunkSize rows at a
+        time, so temporary memory is bounded by the chunk, not the file.
+        With cacheFolder, cleaned frames are cached there and reused as long
+        as the data file does not change. renderCache, a RenderCache, is
+        given to every plot so unchanged plots are not rendered again.
+        With compact, numeric columns are stored as float32 where precision
+        allows and the index as categories."""
         self.tableName = tableName
         self.dataFile = dataFile
-        self.data = pd.read_csv(self.dataFile)
-        self.data = self.concatenate_dates()
-        self.data = self.clean_column_text(DATA_INDEX)
-        self.data = self.set_index(DATA_INDEX)
-        self.description = self.data.describe()
-        self.numericData = self.data.select_dtypes(include=['float64'])
+        self.chunkSize = chunkSize
+        self.renderCache = renderCache
+        self.compact = compact
+        self.cache = DataCache(cacheFolder) if cacheFolder else None
+        self.statistics = None  # running statistics, kept by chunked reads and appends
+        self.correlation = None  # running correlation sums, idem
+        with stage('load', table=tableName) as timer:
+            cached = None
+            if self.cache:
+                self.cacheKey = self.cache.key(self.dataFile) + ('.compact' if compact else '')
+                cached = self.cache.load(self.cacheKey)
+
+            if cached:
+                self.data, self.numericData, self.description = cached
+            else:
+                self.data, self.description = self.read_data()
+                if compact:
+                    self.data = self.compact_data(self.data)
+                self.numericData = self.data.select_dtypes(include=NUMERIC_DTYPES)
+                if self.cache:
+                    self.cache.store(self.cacheKey, self.data, self.numericData, self.description)
+            timer.add(rows=len(self.data.index), cached=bool(cached))
         self.currentData = self.numericData
-        self.summary = self.data.describe()
+        self._memo = {}  # derived data, see memoized
+        self.groupIndex = GroupIndex(self.data.index)
+        self.rowCount, self.staleGroups = len(self.data.index), set()
+        self._normalizedData = None
         self.normalized = normalized
         if normalized:
             self.normalize_data()
 
-    def clean_column_text(self, col):
-        logging.debug('Cleaning "{}" column'.format(col))
-        column = self.data[col]
-        column.replace({'([^A-zÀ-ÿ]+|[À-ÿ$]+)': ' '}, regex=True, inplace=True)
-        column = column.str.strip()
-        column.replace({'\s+': '_'}, regex=True, inplace=True)
-        self.data[col] = column
-        print(set(self.data[col]))
-        return self.data
+    def read_data(self):
+        """Read and clean the data file, return it with its description."""
+
+        if self.chunkSize:
+            return self.read_chunks(self.chunkSize)
+
+        self.data = pd.read_csv(self.dataFile)
+        self.data = self.concatenate_dates()
+        self.data = self.clean_column_text(DATA_INDEX)
+        self.data = self.set_index(DATA_INDEX)
+        return self.data, self.data.describe(include=['number'])  # as read_chunks and the cache
+
+    def read_chunks(self, chunkSize):
+        """Read, clean and describe the data file chunkSize rows at a time."""
+
+        statistics, correlation, chunks = RunningStatistics(), RunningCorrelation(), []
+        for chunk in pd.read_csv(self.dataFile, chunksize=chunkSize):
+            chunk = self.concatenate_dates(chunk)
+            chunk = self.clean_column_text(DATA_INDEX, chunk)
+            chunk = self.set_index(DATA_INDEX, chunk)
+            statistics.update(chunk.select_dtypes(include=['number']))
+            correlation.update(chunk.select_dtypes(include=['number']))
+            chunks.append(chunk)
+
+        data = pd.concat(chunks)
+        del chunks
+        if not isinstance(data.index, pd.CategoricalIndex):  # chunks had different names
+            data.index = pd.CategoricalIndex(data.index, name=data.index.name)
+        quartiles = data[statistics.count.index].quantile([0.25, 0.5, 0.75])
+        description = statistics.describe(quartiles)
+        self.statistics, self.correlation = statistics, correlation
+
+        logging.debug('Data read by chunks of %s rows', chunkSize)
+        return data, description
+
+    def append(self, rows):
+        """Add raw rows, as read from the data file, to the data.
+
+        Only the new rows are cleaned. The description is updated from
+        running statistics, without its quartiles, and the groups of the
+        new rows are marked stale for transpose_stale. rows is not modified."""
+
+        rows = self.concatenate_dates(rows.copy())  # cleaning is done in place
+        rows = self.clean_column_text(DATA_INDEX, rows)
+        rows = self.set_index(DATA_INDEX, rows)
+        rows = rows.astype({c: t for c, t in self.data.dtypes.items() if c in rows.columns})
+
+        if self.statistics is None:  # first append: start from the current data
+            self.statistics = RunningStatistics().update(self.data.select_dtypes(include=['number']))
+        self.statistics.update(rows.select_dtypes(include=['number']))
+        self.description = self.statistics.describe()
+        if self.correlation is not None:
+            self.correlation.update(rows.select_dtypes(include=['number']))
+
+        self.data = pd.concat([self.data, rows])
+        if not isinstance(self.data.index, pd.CategoricalIndex):  # new names
+            self.data.index = pd.CategoricalIndex(self.data.index, name=self.data.index.name)
+        self.numericData = self.data.select_dtypes(include=NUMERIC_DTYPES)
+        self._normalizedData = None
+        self.set_current_data(self.normalizedData if self.normalized else self.numericData, self.normalized)
+
+        self.staleGroups |= self.groupIndex.extend(rows.index)
+        self.rowCount += len(rows.index)
+
+        logging.debug('%s rows appended', len(rows.index))
+        return self
+
+    def refresh(self):
+        """Append the rows added to the data file since it was read.
+
+        Return the number of new rows."""
+
+        rowCount = self.rowCount
+        newRows = pd.read_csv(self.dataFile, skiprows=range(1, rowCount + 1),
+                              chunksize=self.chunkSize or None)
+        for rows in ([newRows] if isinstance(newRows, pd.DataFrame) else newRows):
+            if len(rows.index):
+                self.append(rows)
+
+        if self.cache and self.rowCount > rowCount:
+            self.cacheKey = self.cache.key(self.dataFile) + ('.compact' if self.compact else '')
+            self.cache.store(self.cacheKey, self.data, self.numericData, self.description)
+
+        logging.debug('Data refreshed')
+        return self.rowCount - rowCount
+
+    def compact_data(self, data):
+        """Downcast float64 columns to float32 and the index to categories.
+
+        A column is only downcast if its values are written with at most
+        COMPACT_DECIMALS decimals, as read from the file, and float32 keeps
+        every one of them to its last decimal. Other columns stay float64."""
+
+        for col in data.select_dtypes(include=['float64']).columns:
+            values = data[col].values
+            decimals = _decimals(values)
+            if decimals is None:
+                continue
+            with np.errstate(over='ignore', invalid='ignore'):
+                compact = values.astype('float32')
+                close = np.abs(compact - values) < 0.5 * 10.0 ** -decimals
+            if np.all(close | np.isnan(values) | (compact == values)):  # infinite values stay infinite
+                data[col] = compact
+
+        if not isinstance(data.index, pd.CategoricalIndex):
+            data.index = pd.CategoricalIndex(data.index, name=data.index.name)
+
+        logging.debug('Data compacted')
+        return data
+
+    def clean_column_text(self, col, data=None):
+        """Clean the names of col once per unique value, store them as sorted categories."""
+        logging.debug('Cleaning "%s" column', col)
+        data = self.data if data is None else data
+        with stage('clean', column=col, rows=len(data.index)) as timer:
+            codes, uniques = pd.factorize(data[col])
+            cleaned = ['_'.join(NAME_PATTERN.sub(' ', str(name)).split()) for name in uniques]
+            # merge names cleaned alike
+            cleanCodes, categories = pd.factorize(np.asarray(cleaned, dtype=object), sort=True)
+            codes = np.where(codes >= 0, cleanCodes[codes], -1)  # missing names stay missing
+            data[col] = pd.Categorical.from_codes(codes, categories)
+            timer.add(names=len(categories))
+        return data
+
+    def set_index(self, col, data=None):
+        logging.debug('Set "%s" column as index', col)
+        data = self.data if data is None else data
+        data.set_index(col, inplace=True)
+        return data
 
-    def set_index(self, col):
-        logging.debug('Set "{}" column as index'.format(col))
-        self.data.set_index(col, inplace=True)
-        return self.data
+    def boxplot_all_quartiles(self, summary=False, sampleSize=None):  # works
+        """Plot all normalized quartiles.
 
-    def boxplot_all_quartiles(self):  # works
-        """Plot all normalized quartiles."""
+        With summary, only the quartiles, whiskers and outliers of each
+        attribute are plotted, so the page size does not grow with the data."""
 
         title = "Quartile Ranges"
-        data = self.currentData
-        # Prepare a new, simpler data frame with only attributes and their values
-        data = data.stack()  # Stack data to get one attribute value per line
-        newData = []
-        for d in data.items():
-            newData.append([d[0][1], d[1]])  # Select the attribute and its value
+        if summary:
+            return self.boxplot_quartile_summary(title, sampleSize)
 
-        newData = pd.DataFrame(newData, columns=['attribute', 'value'])
-        lines = {'line': dict(data=newData, bokehType='BoxPlot', values='value',
+        lines = {'line': dict(data=self.long_format(), bokehType='BoxPlot', values='value',
                               label='attribute', title=title)}
-        fig = BokehPlot('boxplot_all_quartiles', lines)  # pyflakes:ignore:E0602
+        fig = BokehPlot('boxplot_all_quartiles', lines, cache=self.renderCache)  # pyflakes:ignore:E0602
 
         logging.debug('Boxplot generated')
         return fig  # return the boxplot graph for html generation
 
-    def parallel_coordinates_graph(self):  # works
-        """Open a parallel coordinates graph of the attributes."""
-        # TODO Add plot element to generate CategoricalTi
+    @memoized
+    def long_format(self):
+        """Return currentData as one attribute and its value per row."""
+
+        # Prepare a new, simpler data frame with only attributes and their values
+        with stage('build_lines', plot='boxplot_all_quartiles') as timer:
+            newData = self.currentData.melt(var_name='attribute', value_name='value').dropna(subset=['value'])
+            newData['attribute'] = newData['attribute'].astype('category')
+            timer.add(points=len(newData.index))
+        return newData
+
+    @memoized
+    def quartile_summary(self, sampleSize=None):
+        """Return the box and the outliers of each attribute.
+
+        Quartiles are estimated on a random sample of sampleSize rows if
+        given; whiskers and outliers are always taken from the whole data."""
 
-        title = 'parallel_coordinates_graph'
         data = self.currentData
-        indexes = [x for x in set(self.data.index)]
+        sample = data
+        if sampleSize and sampleSize < len(data.index):
+            sample = data.sample(n=sampleSize, random_state=0)
+
+        quartiles = sample.quantile([0.25, 0.5, 0.75])
+        q1, q2, q3 = quartiles.loc[0.25], quartiles.loc[0.5], quartiles.loc[0.75]
+        lowerFence, upperFence = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+        inside = (data >= lowerFence) & (data <= upperFence)
+
+        boxes = pd.DataFrame({'q1': q1, 'q2': q2, 'q3': q3,
+                              'lower': data.where(inside).min(),
+                              'upper': data.where(inside).max()})
+        boxes['attribute'] = [str(c) for c in boxes.index]
+
+        outliers = data.where(~inside).melt(var_name='attribute', value_name='value')
+        outliers = outliers.dropna(subset=['value'])
+        if len(outliers.index) > MAX_OUTLIERS:
+            outliers = outliers.sample(n=MAX_OUTLIERS, random_state=0)
+        outliers['attribute'] = outliers['attribute'].astype(str)
+
+        logging.debug('Quartile summary computed')
+        return boxes, outliers
+
+    def boxplot_quartile_summary(self, title, sampleSize=None):
+        """Plot boxes, whiskers and outliers from the quartile summary."""
+        from bokeh.palettes import Inferno9
+
+        boxes, outliers = self.quartile_summary(sampleSize)
+        lines = {
+            'upper_box': dict(data=boxes, bokehType='vbar', x='attribute', width=0.7,
+                              bottom='q2', top='q3', fill_color=Inferno9[5], line_color='black'),
+            'lower_box': dict(data=boxes, bokehType='vbar', x='attribute', width=0.7,
+                              bottom='q1', top='q2', fill_color=Inferno9[7], line_color='black'),
+            'upper_whisker': dict(data=boxes, bokehType='segment', x0='attribute', y0='q3',
+                                  x1='attribute', y1='upper', line_color='black'),
+            'lower_whisker': dict(data=boxes, bokehType='segment', x0='attribute', y0='q1',
+                                  x1='attribute', y1='lower', line_color='black'),
+            'outliers': dict(data=outliers, bokehType='circle', x='attribute', y='value',
+                             size=4, fill_alpha=0.6)}
+        fig = BokehPlot('boxplot_all_quartiles', lines,
+                        figProp=dict(x_range=list(boxes['attribute']), title=title), cache=self.renderCache)
+
+        logging.debug('Summary boxplot generated')
+        return fig
 
-        colorMap = cmax.viridis
-        cNorm = colors.Normalize(vmin=0, vmax=len(indexes)-1)
-        scalarMap = cmax.ScalarMappable(norm=cNorm, cmap=colorMap)
+    def parallel_coordinates_graph(self, maxPoints=None):  # works
+        """Open a parallel coordinates graph of the attributes.
 
-        lines = {}
-        for i in range(len(indexes)):
-            colorVal = scalarMap.to_rgba(i)
-            colorVal = colors.rgb2hex(colorVal)
-            indexLines = len(data.loc[indexes[i]].values)
-            xs = [list(range(len(data.columns)))]*indexLines
-            ys = [list(v) for v in data.loc[indexes[i]].values]
-            lines[indexes[i]] = dict(x=xs, y=ys, line_color=colorVal, bokehType='multi_line')
-
-        fig = BokehPlot(title, lines, interactive=True)
+        maxPoints caps the points drawn, by keeping evenly spread rows."""
+        from bokeh.palettes import Viridis256
+        # TODO Add plot element to generate CategoricalTi
+
+        title = 'parallel_coordinates_graph'
+        data = self.currentData
+        with stage('build_lines', plot=title) as timer:
+            codes = self.groupIndex.codes
+            rows = np.flatnonzero(codes >= 0)  # skip rows without a name
+            if maxPoints:  # keep evenly spread rows
+                rows = rows[spread_indices(len(rows), maxPoints // max(len(data.columns), 1))]
+
+            palette = np.asarray(Viridis256)[np.linspace(0, 255, max(len(self.groupIndex), 1)).astype(int)]
+            values = data.values[rows]
+            lines = {'line': dict(data={'xs': [np.arange(len(data.columns))] * len(rows),
+                                        'ys': list(values),
+                                        'line_color': palette[codes[rows]],
+                                        GROUP_COLUMN: codes[rows]},
+                                  xs='xs', ys='ys', line_color='line_color', bokehType='multi_line')}
+            timer.add(rows=len(rows), points=values.size)
+
+        fig = BokehPlot(title, lines, interactive=True, groups=[str(name) for name in self.groupIndex.names],
+                        cache=self.renderCache)
         logging.debug('Parallel coordinates graph generated')
         return fig
 
     def heatmap_pearson_correlation(self):  # works
         """Create a heatmap of attributes."""
+        from bokeh.palettes import Inferno9
 
-        data = self.currentData
-
-        data = data.corr(method='pearson')
+        data = self.correlation_matrix()
         title = 'heatmap_pearson_correlation'
 
-        values = []
-        for v in list(data.values):
-            values.extend(v)
-
-        x, y = [], []
-        for c in list(data.columns):
-            x.extend([c]*len(data.index))
-            y.append(c)
-
-        y = y * len(data.columns)
-        data = {'x': x, 'y': y, 'values': values}
+        with stage('build_lines', plot=title, points=data.size):
+            columns = np.asarray(data.columns, dtype=object)
+            data = {'x': np.repeat(columns, len(columns)), 'y': np.tile(columns, len(columns)),
+                    'values': data.values.ravel()}
         lines = {'line': dict(data=data, x='x', y='y', values='values',
                               bokehType='HeatMap', title=title, stat=None, palette=Inferno9)}
-        fig = BokehPlot(title, lines)
+        fig = BokehPlot(title, lines, cache=self.renderCache)
 
         logging.debug('Heatmap of Pearson correalation generated')
         return fig  # return the boxplot graph for html generation
 
+    @memoized
+    def correlation_matrix(self):
+        """Return the Pearson correlations of currentData.
+
+        The pairwise sums are accumulated by chunks of CORRELATION_CHUNK
+        rows, or while reading and appending, and kept for later calls.
+        Normalizing does not change correlations, so they are computed on
+        the numeric data whatever currentData is."""
+
+        if self.correlation is None:
+            self.correlation = RunningCorrelation()
+            for start in range(0, len(self.numericData.index), CORRELATION_CHUNK):
+                self.correlation.update(self.numericData.iloc[start:start + CORRELATION_CHUNK])
+
+        columns = self.currentData.columns
+        return self.correlation.correlation().reindex(index=columns, columns=columns)
+
     def cross_plotting_pair_of_attributes(self, firstCol, secondCol):  # works
         """Open a a graph of correlated pairs of attributes."""
 
@@ -138,132 +386,234 @@ class DataPlot():
         lines = {}
         lines = {'line': dict(data=self.data, x=firstCol, y=secondCol,
                               bokehType='Scatter', title=title)}
-        fig = BokehPlot(title, lines)
+        fig = BokehPlot(title, lines, cache=self.renderCache)
 
         logging.debug('Pair of attribute crossplotted')
         return fig  # return the boxplot graph for html generation
 
-    def plot_target_correlation(self, col):  # works
-        """Open a graph of attribute and its target attribute."""
-        # TODO display attribute names on x axis
-
-        attributes = set(self.data.index)
-        increment, i, attributesDict = 1 / len(attributes), 0, {}
-        for attribute in attributes:
-            attributesDict[attribute] = i
-            i += increment
+    def plot_target_correlation(self, col, seed=0):  # works
+        """Open a graph of attribute and its target attribute.
 
-        targetValues = []
-        for i in self.data.index:
-            # add some dither
-            targetValues.append(attributesDict[i] + uniform(-0.1, 0.1))
+        col may also be a list of columns: the dither is then drawn once and
+        a list of graphs is returned. seed makes the dither reproducible."""
+        # TODO display attribute names on x axis
 
-        title = 'plot_target_correlation' + ':  ' + col
-        lines = {}
-        data = pd.DataFrame(list(zip(targetValues, self.data[col].values)), columns=['Attribute Value', 'Target Value'])
-        lines['line'] = dict(data=data, x='Attribute Value', y='Target Value', bokehType='Scatter', title=title)
-        fig = BokehPlot(title, lines)
+        cols = [col] if isinstance(col, str) else list(col)
+        codes = self.groupIndex.codes  # names sorted when read, appended names come last
+        # add some dither
+        dither = np.random.RandomState(seed).uniform(-0.1, 0.1, len(codes))
+        attributeValues = codes / len(self.groupIndex) + dither
+
+        figs = []
+        for target in cols:
+            title = 'plot_target_correlation' + ':  ' + target
+            lines = {}
+            data = pd.DataFrame({'Attribute Value': attributeValues, 'Target Value': self.data[target].values},
+                                columns=['Attribute Value', 'Target Value'])
+            lines['line'] = dict(data=data, x='Attribute Value', y='Target Value', bokehType='Scatter', title=title)
+            figs.append(BokehPlot(title, lines, cache=self.renderCache))
 
         logging.debug('Target correlation plotted')
-        return fig  # return the boxplot graph for html generation
+        return figs[0] if isinstance(col, str) else figs  # return the graphs for html generation
+
+    @property
+    def normalizedData(self):
+        """Z-scored numeric data, computed in one pass on first access."""
+
+        if self._normalizedData is None:
+            with stage('normalize', rows=len(self.numericData.index)):
+                columns = self.numericData.columns
+                mean = self.description.loc['mean', columns]
+                std_dev = self.description.loc['std', columns]
+                if self.compact:  # keep float32 columns in float32
+                    mean, std_dev = mean.astype('float32'), std_dev.astype('float32')
+                self._normalizedData = (self.numericData - mean) / std_dev
+            logging.debug('Data normalized')
+        return self._normalizedData
+
+    def set_current_data(self, data, normalized):
+        """Plot data from now on, forget what was derived from the previous data."""
+        if data is not self.currentData:
+            self._memo = {}
+        self.currentData, self.normalized = data, normalized
+
+    @property
+    @memoized
+    def summary(self):
+        """Full description of the data, quartiles included."""
+        if '25%' in self.description.index:
+            return self.description
+        return self.data.describe(include=['number'])  # appends only keep running statistics
 
     def normalize_data(self):
         """Normalize columns to improve graphical representations."""
-
-        self.normalizedData = self.numericData.copy()
-        for i in range(len(self.normalizedData.columns)):
-            mean = self.description.iloc[1, i]
-            std_dev = self.description.iloc[2, i]
-            self.normalizedData.iloc[:, i:(i+1)] = (self.normalizedData.iloc[:, i:(i+1)] - mean) / std_dev
-
-        logging.debug('Data normalized')
-        self.currentData, self.normalized = self.normalizedData, True
+        self.set_current_data(self.normalizedData, True)
 
     def denormalize_data(self):
         """Denormalize columns."""
-        self.currentData, self.normalized = self.numericData, False
+        self.set_current_data(self.numericData, False)
         logging.debug('Data denormalized')
 
-    def concatenate_dates(self):
+    def concatenate_dates(self, data=None):
         """Concatenate year, month, day into a date, fill month, day if needed."""
 
-        data = self.data
-        try:
-            data['day']
-        except KeyError:  # set day to 1
-            data['day'] = pd.Series([1]*len(data.index), index=data.index)
-
-        try:
-            data['month']
-        except KeyError:  # set day to 1
-            data['month'] = pd.Series([1]*len(data.index), index=data.index)
-
-        try:
-            data['year']
-        except KeyError:  # set day to 1
-            assert data['date'], 'ERROR: No date available in dataset.'
-
-        dataDate = data[['year', 'month', 'day']].astype(int)  # select date related columns
-        dataDate = pd.to_datetime(dataDate)
-        data['date'] = pd.Series(dataDate, index=data.index)
-        data.drop(['year', 'month', 'day'], axis=1, inplace=True)
+        data = self.data if data is None else data
+        with stage('clean', column='date', rows=len(data.index)):
+            if 'year' not in data.columns:  # keep an existing date column
+                assert 'date' in data.columns, 'ERROR: No date available in dataset.'
+                if not pd.api.types.is_datetime64_any_dtype(data['date']):
+                    data['date'] = pd.to_datetime(data['date'])
+                logging.debug('Date column kept')
+                return data
+
+            # missing month or day columns default to 1, broadcast as scalars
+            parts = {}
+            for col in ['year', 'month', 'day']:
+                if col in data.columns:
+                    values = data[col].values.astype('float64')
+                    assert np.all(np.isfinite(values)), 'ERROR: Missing {} value.'.format(col)
+                    parts[col] = values.astype('int64')
+                else:
+                    parts[col] = 1
+            years, months, days = parts['year'], parts['month'], parts['day']
+            assert np.all((years >= YEAR_RANGE[0]) & (years <= YEAR_RANGE[1])), 'ERROR: Year out of range.'
+            assert np.all((months >= 1) & (months <= 12)), 'ERROR: Month out of range.'
+            assert np.all(days >= 1), 'ERROR: Day out of range.'
+
+            # months since 1970-01, to the first day of the month, plus the days
+            monthStarts = ((years - 1970) * 12 + (months - 1)).astype('datetime64[M]')
+            dates = monthStarts.astype('datetime64[D]') + (days - 1)
+            assert np.all(dates.astype('datetime64[M]') == monthStarts), 'ERROR: Day out of range for month.'
+            data['date'] = dates.astype('datetime64[ns]')
+            data.drop([c for c in ['year', 'month', 'day'] if c in data.columns], axis=1, inplace=True)
 
         logging.debug('Dates concatenated')
 
         return data
 
-    def create_transposed_plot(self, name, dataset):
+    @staticmethod
+    def transposed_figure(name, dataset, maxPoints=None, renderCache=None):
+        """Return the BokehPlot of one index group's numeric columns against its dates.
+
+        maxPoints caps the points drawn over all series of the plot;
+        renderCache serves the HTML of unchanged groups."""
+        from bokeh.palettes import brewer
 
         name = name.replace('/ ', '_').replace('/', ' ')  # correct encoding error
-        dataset = dataset.select_dtypes(include=['float64', 'datetime64'])
-        dataset = dataset.sort_values('date')
-        dataset = dataset.transpose()
-        # years, months = mdates.YearLocator(), mdates.MonthLocator()
-        colors = brewer['Paired'][len(dataset.index)]  # generate color palette
-        lines = {}
-        for i, color in zip(dataset.index, colors):  # associate colors with index
-            if i != 'date':  # ignore date row
-                lines[i] = dict(x=list(dataset.loc['date']), y=list(dataset.loc[i]),
-                                bokehType='line', legend=i, color=color)
+        with stage('build_lines', plot=name, rows=len(dataset.index)):
+            dataset = dataset.select_dtypes(include=NUMERIC_DTYPES + ['datetime64'])
+            dataset = dataset.sort_values('date')
+            # years, months = mdates.YearLocator(), mdates.MonthLocator()
+            colors = brewer['Paired'][len(dataset.columns)]  # generate color palette
+            dates = dataset['date'].values  # one array shared by every series
+            lines = {}
+            for i, color in zip(dataset.columns, colors):  # associate colors with columns
+                if i != 'date':  # ignore date column
+                    lines[i] = dict(x=dates, y=dataset[i].values,
+                                    bokehType='line', legend=i, color=color)
 
         logging.debug('Transposed plot created')
 
-        plot = BokehPlot(name, lines, figProp=dict(x_axis_type='datetime', title=name))
+        return BokehPlot(name, lines, figProp=dict(x_axis_type='datetime', title=name), maxPoints=maxPoints,
+                         cache=renderCache)
 
-        html = file_html(plot.document(), CDN)
+    @staticmethod
+    def create_transposed_plot(name, dataset, maxPoints=None, renderCache=None):
+        """Plot the numeric columns of one index group against its dates.
+
+        Static so that parallel workers receive the group, not the DataPlot."""
+
+        plot = DataPlot.transposed_figure(name, dataset, maxPoints, renderCache)
+        html = plot.render()
 
         return html, plot.plotName
 
-    def transpose_index(self):  # WORKS ONLY FOR TEST DATA
-        """Transpose the data according to the index."""
+    def transpose_index(self, workers=None, maxPoints=None, saveFolder=None, groups=None):  # WORKS ONLY FOR TEST DATA
+        """Transpose the data according to the index.
+
+        Groups are taken from the group index and submitted to the pool in a
+        single batch; each worker only receives its own group's rows.
+        With saveFolder, the rendered pages are written there by an
+        ExportWriter while the remaining groups are still being plotted.
+        groups restricts the transposition to these index names.
+        Pages in renderCache are looked up here, before submitting the
+        groups, and the pages rendered by the workers are added to it."""
+        from pathos.multiprocessing import ProcessingPool  # only needed here, slow to import
+
+        requested = list(self.groupIndex.names if groups is None else groups)
+        names, datasets, keys, cached = [], [], [], {}
+        for name in requested:
+            dataset = self.groupIndex.take(self.data, name)
+            if self.renderCache is not None:
+                plot = DataPlot.transposed_figure(str(name), dataset, maxPoints)
+                key = plot.cache_key()
+                html = self.renderCache.get(key)
+                if html is not None:  # unchanged group, not submitted
+                    cached[str(name)] = (html, plot.plotName)
+                    continue
+                keys.append(key)
+            names.append(str(name))
+            datasets.append(dataset)
+
+        pool = ProcessingPool(nodes=workers) if workers else ProcessingPool()
+        rendered = pool.imap(DataPlot.create_transposed_plot, names, datasets, [maxPoints] * len(names))
+        if self.renderCache is not None:
+            rendered = self._cache_pages(rendered, keys)
+        results = (cached[str(name)] if str(name) in cached else next(rendered) for name in requested)
+
+        if saveFolder:  # write pages in the background as the workers return them
+            plots = []
+            with ExportWriter() as writer:
+                for html, plotName in results:
+                    writer.write(osjoin(saveFolder, plotName + '.html'), html)
+                    plots.append((html, plotName))
+            logging.debug('Transposed plots saved')
+        else:
+            plots = list(results)
 
-        data = self.data
-        indexes = list(set(data.index))
+        logging.debug('Index transposed')
 
-        names, datasets = [], []
-        for name in indexes:
-            names.append(name)
-            datasets.append(data[[name in i for i in data.index]])
+        return [[plot] for plot in plots]  # one result list per group, as before
 
-        plotSets = zip(names, datasets)
+    def _cache_pages(self, results, keys):
+        """Add the pages of results to renderCache as they come, not public."""
+        for (html, plotName), key in zip(results, keys):
+            self.renderCache.put(key, html)
+            yield html, plotName
 
-        pool = ProcessingPool()
-        plots = []
-        for name, dataset in plotSets:
-            plots.append(pool.map(self.create_transposed_plot, [name], [dataset]))
+    def transpose_stale(self, **kwargs):
+        """Transpose only the index groups with rows appended since last time.
 
-        logging.debug('Index transposed')
+        Keyword arguments are passed to transpose_index."""
 
+        plots = self.transpose_index(groups=self.staleGroups, **kwargs)
+        self.staleGroups = set()
         return plots
 
+    def transposed_document(self, layout='tabs', maxPoints=None):
+        """Return the transposed plots of all index groups as one HTML page.
+
+        The figures are serialized together with a single copy of the Bokeh
+        resources, instead of one standalone page per group."""
+
+        plots = [DataPlot.transposed_figure(str(name), dataset, maxPoints)
+                 for name, dataset in self.groupIndex.groups(self.data)]
+        html = BokehPlot.render_batch(plots, self.tableName, layout=layout)
+
+        logging.debug('Transposed document generated')
+        return html
+
 if __name__ == '__main__':
-    start = clock()
+    logging.basicConfig(
+        level=logging.DEBUG, format=' %(asctime)s - %(levelname)s - %(message)s')
+    # Benchmarks on synthetic data: python -m mLearning.benchmark
+    start = perf_counter()
     # logger = logging.getLogger()
     # logger.setLevel(logging.ERROR)
-    dataFile = '/home/vifespoir/github/mLearningApp/mLearning/data/US/veggies-imp.csv'
+    dataFile = sys.argv[1]  # eg. data/US/veggies-imp.csv
     plots = DataPlot('us-veggies', dataFile, False)
     plots = plots.transpose_index()
-    print('Runtime to transpose_index: {:.2f} second(s)'.format(clock() - start))
+    print('Runtime to transpose_index: {:.2f} second(s)'.format(perf_counter() - start))
     # plots.boxplot_all_quartiles(normalized=True)
     # plots.boxplot_all_quartiles(normalized=False)
     # plots.plot_target_correlation('vol')
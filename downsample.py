@@ -0,0 +1,75 @@
+"""Shape-preserving decimation of plotted series."""
+import numpy as np
+
+__all__ = ('lttb_indices', 'minmax_indices', 'spread_indices')
+
+
+def _as_float(values):
+    """Return values as a float array, dates as nanoseconds, not public."""
+
+    values = np.asarray(values)
+    if values.dtype == object:  # eg. a list of pandas Timestamps
+        values = values.astype('datetime64[ns]')
+    if np.issubdtype(values.dtype, np.datetime64):
+        values = values.astype('datetime64[ns]').astype('int64')
+    return values.astype('float64')
+
+
+def lttb_indices(x, y, threshold):
+    """Return the indices of at most threshold points kept by LTTB.
+
+    Largest-Triangle-Three-Buckets keeps the first and last points and, in
+    each bucket in between, the point forming the largest triangle with
+    the previously kept point and the average of the next bucket. Below 3
+    points, evenly spread points are kept."""
+
+    x, y = _as_float(x), _as_float(y)
+    length = len(y)
+    if threshold >= length:
+        return np.arange(length)
+    if threshold < 3:  # no bucket between the first and last points
+        return spread_indices(length, threshold)
+
+    every = (length - 2) / (threshold - 2)
+    indices, a = [0], 0
+    for i in range(threshold - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        nextEnd = min(int((i + 2) * every) + 1, length)
+        avgX, avgY = x[end:nextEnd].mean(), np.nanmean(y[end:nextEnd])
+        area = np.abs((x[a] - avgX) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avgY - y[a]))
+        area[np.isnan(area)] = -1
+        a = start + int(np.argmax(area))
+        indices.append(a)
+    indices.append(length - 1)
+
+    return np.asarray(indices)
+
+
+def minmax_indices(x, y, threshold):
+    """Return the indices of the min and max of threshold // 2 buckets.
+
+    Below 4 points, evenly spread points are kept."""
+
+    y = _as_float(y)
+    length = len(y)
+    if threshold >= length:
+        return np.arange(length)
+    if threshold < 4:  # no bucket between the first and last points
+        return spread_indices(length, threshold)
+
+    indices = [0, length - 1]
+    for bucket in np.array_split(np.arange(1, length - 1), threshold // 2 - 1):
+        values = y[bucket]
+        if np.isnan(values).all():
+            continue
+        indices.extend([bucket[np.nanargmin(values)], bucket[np.nanargmax(values)]])
+
+    return np.unique(indices)
+
+
+def spread_indices(length, count):
+    """Return count indices spread evenly over range(length)."""
+
+    if count >= length:
+        return np.arange(length)
+    return np.unique(np.linspace(0, length - 1, max(count, 1)).round().astype(int))
@@ -0,0 +1,60 @@
+"""Row positions of each index group, computed once."""
+import numpy as np
+import pandas as pd
+
+__all__ = ('GroupIndex')
+
+
+class GroupIndex(object):
+    """Map each index value to its row positions through sorted offsets."""
+
+    def __init__(self, index):
+        """Initialize GroupIndex from a pandas index."""
+        self.codes, self.names = pd.factorize(index, sort=True)
+        self.codes = np.asarray(self.codes)
+        self.lookup = {name: code for code, name in enumerate(self.names)}
+        self._sort()
+
+    def _sort(self):
+        """Sort row positions by group and compute group offsets, not public."""
+
+        valid = self.codes >= 0  # missing index values have code -1
+        self.order = np.argsort(self.codes, kind='mergesort')[np.count_nonzero(~valid):]
+        counts = np.bincount(self.codes[valid], minlength=len(self.names))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def extend(self, index):
+        """Add the rows of index after the current rows.
+
+        New names get the next codes; return the set of names touched."""
+
+        codes, names = pd.factorize(index)
+        newNames = [name for name in names if name not in self.lookup]
+        if newNames:
+            self.lookup.update({name: len(self.names) + i for i, name in enumerate(newNames)})
+            self.names = self.names.append(pd.Index(newNames))
+
+        mapping = np.array([self.lookup[name] for name in names], dtype='int64')
+        codes = np.asarray(codes)
+        codes = np.where(codes >= 0, mapping[np.maximum(codes, 0)] if len(mapping) else -1, -1)
+        self.codes = np.concatenate([self.codes, codes])
+        self._sort()
+        return set(names)
+
+    def __len__(self):
+        """Return the number of groups."""
+        return len(self.names)
+
+    def positions(self, name):
+        """Return the row positions of the group name."""
+        code = self.lookup[name]
+        return self.order[self.offsets[code]:self.offsets[code + 1]]
+
+    def take(self, data, name):
+        """Return the rows of data belonging to the group name."""
+        return data.iloc[self.positions(name)]
+
+    def groups(self, data):
+        """Yield (name, rows) for every group of data."""
+        for name in self.names:
+            yield name, self.take(data, name)
@@ -0,0 +1,90 @@
+"""Per-stage timings and counts of the plotting pipeline.
+
+Stages are reported to a sink, any callable taking one dict, eg.
+JSONLinesSink or a metrics callback. Without a sink, stage() returns a
+shared no-op object, so instrumented code costs one call per stage."""
+import json
+import threading
+from time import perf_counter
+
+__all__ = ('enable', 'disable', 'stage', 'JSONLinesSink')
+
+
+_sink = None
+
+
+def enable(sink):
+    """Report every stage to sink, a callable taking one dict."""
+    global _sink
+    _sink = sink
+
+
+def disable():
+    """Stop reporting stages."""
+    global _sink
+    _sink = None
+
+
+class _Stage(object):
+    """Time a block of code and report it with its counts, not public."""
+
+    def __init__(self, sink, name, counts):
+        """Initialize _Stage."""
+        self.sink, self.record = sink, dict(counts, stage=name)
+
+    def add(self, **counts):
+        """Record counts known inside the block, eg. rows, points, bytes."""
+        self.record.update(counts)
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, excType, exc, traceback):
+        self.record['seconds'] = perf_counter() - self.start
+        if excType is not None:
+            self.record['error'] = excType.__name__
+        self.sink(self.record)
+
+
+class _NoStage(object):
+    """Stand-in for _Stage when instrumentation is disabled, not public."""
+
+    def add(self, **counts):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, exc, traceback):
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name, **counts):
+    """Return a context manager timing the stage name, see _Stage.add."""
+
+    if _sink is None:
+        return _NO_STAGE
+    return _Stage(_sink, name, counts)
+
+
+class JSONLinesSink(object):
+    """Append each stage as one JSON line to a file or a stream."""
+
+    def __init__(self, output):
+        """Initialize JSONLinesSink with a file path or an open stream."""
+        self.stream = open(output, 'a') if isinstance(output, str) else output
+        self.lock = threading.Lock()  # stages may end in writer threads
+
+    def __call__(self, record):
+        line = json.dumps(record, default=str) + '\n'
+        with self.lock:
+            self.stream.write(line)
+            self.stream.flush()
+
+    def close(self):
+        """Close the stream."""
+        self.stream.close()
@@ -0,0 +1,86 @@
+"""Background writer for rendered plot pages."""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from os import O_RDONLY, close, fsync, makedirs, open as osopen
+from os.path import abspath, dirname, exists
+from threading import BoundedSemaphore
+from time import perf_counter
+from mLearning.instrumentation import stage
+
+__all__ = ('ExportWriter')
+
+
+WRITE_WORKERS = 2
+MAX_PENDING = 32  # rendered pages held in memory before write() blocks
+
+
+class ExportWriter(object):
+    """Write pages from a pool of threads while the caller keeps rendering.
+
+    write() blocks once maxPending pages are queued, so memory stays
+    bounded when rendering is faster than the disk. close() waits for all
+    writes, fsyncs their folders and returns the write latency per file."""
+
+    def __init__(self, workers=WRITE_WORKERS, maxPending=MAX_PENDING, sync=True):
+        """Initialize ExportWriter."""
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = BoundedSemaphore(maxPending)
+        self.sync = sync
+        self.futures, self.folders, self.latencies = [], set(), {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, path, html):
+        """Queue html to be written to path."""
+
+        folder = dirname(abspath(path))
+        if folder not in self.folders:
+            if not exists(folder):
+                makedirs(folder)
+            self.folders.add(folder)
+
+        self.slots.acquire()  # backpressure
+        future = self.executor.submit(self._write, path, html)
+        future.add_done_callback(lambda f: self.slots.release())
+        self.futures.append(future)
+
+    def _write(self, path, html):
+        """Write and flush one page, in a worker thread, not public."""
+
+        start = perf_counter()
+        with stage('write', path=path, bytes=len(html)), open(path, 'w') as page:
+            page.write(html)
+            page.flush()
+            if self.sync:
+                fsync(page.fileno())
+        self.latencies[path] = perf_counter() - start
+
+    def close(self):
+        """Wait for the queued writes, fsync their folders, stop the workers."""
+
+        try:
+            for future in self.futures:
+                future.result()  # raise write errors in the caller
+        finally:
+            self.executor.shutdown()
+            self.futures = []
+
+        if self.sync:
+            for folder in self.folders:
+                try:
+                    descriptor = osopen(folder, O_RDONLY)
+                except OSError:  # eg. folders cannot be opened on Windows
+                    continue
+                try:
+                    fsync(descriptor)
+                finally:
+                    close(descriptor)
+
+        if self.latencies:
+            logging.debug('%s pages written, slowest in %.4f second(s)',
+                          len(self.latencies), max(self.latencies.values()))
+        return self.latencies
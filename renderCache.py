@@ -0,0 +1,141 @@
+"""Content-addressed cache of rendered plot HTML."""
+import pandas as pd
+import numpy as np
+import hashlib
+import logging
+from collections import OrderedDict
+from os import listdir, makedirs, remove, stat, utime
+from os.path import exists, join as osjoin
+
+__all__ = ('RenderCache', 'content_key')
+
+
+MAX_BYTES = 256 * 2 ** 20
+EVICT_FRACTION = 16  # scan the folder after writing this fraction of maxBytes
+
+
+def _update_digest(digest, value):
+    """Feed a plot input into digest, recursively, not public."""
+
+    if isinstance(value, dict):
+        for key in sorted(value, key=str):
+            digest.update(str(key).encode())
+            _update_digest(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update('[{}]'.format(len(value)).encode())
+        for item in value:
+            _update_digest(digest, item)
+    elif isinstance(value, (pd.DataFrame, pd.Series)):
+        labels = value.columns if isinstance(value, pd.DataFrame) else [value.name]
+        digest.update(repr(list(labels)).encode())
+        digest.update(pd.util.hash_pandas_object(value).values.tobytes())
+    elif isinstance(value, np.ndarray) and value.dtype != object:
+        digest.update(str(value.dtype).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, np.ndarray):
+        _update_digest(digest, list(value))
+    else:
+        digest.update(repr(value).encode())
+
+
+def content_key(*values):
+    """Return a hash of plot inputs: names, line data, figure properties."""
+
+    digest = hashlib.sha1()
+    for value in values:
+        _update_digest(digest, value)
+    return digest.hexdigest()
+
+
+class RenderCache(object):
+    """Least recently used cache of HTML strings, capped in bytes.
+
+    With a folder, rendered pages are also kept on disk and survive the
+    process. Processes may share the folder: each one scans it when its
+    estimate of the folder size exceeds the cap, or after writing
+    maxBytes / EVICT_FRACTION, so the cap may be briefly overshot."""
+
+    def __init__(self, maxBytes=MAX_BYTES, folder=None):
+        """Initialize RenderCache."""
+        self.maxBytes, self.folder = maxBytes, folder
+        self.pages, self.size = OrderedDict(), 0
+        self.diskSize, self.written = None, 0  # folder size when last scanned, bytes written since
+        if folder and not exists(folder):
+            makedirs(folder)
+
+    def __getstate__(self):
+        """Pickle without the pages held in memory, eg. for pool workers."""
+        state = self.__dict__.copy()
+        state['pages'], state['size'] = OrderedDict(), 0
+        state['diskSize'], state['written'] = None, 0
+        return state
+
+    def _path(self, key):
+        """Return the file path of a cached page, not public."""
+        return osjoin(self.folder, key + '.html')
+
+    def get(self, key):
+        """Return the cached HTML for key, or None."""
+
+        if key in self.pages:
+            self.pages.move_to_end(key)
+            return self.pages[key]
+
+        if self.folder:
+            try:  # another process may evict the page meanwhile
+                with open(self._path(key), 'r') as page:
+                    html = page.read()
+                utime(self._path(key))  # mark as recently used
+            except FileNotFoundError:
+                return None
+            self._remember(key, html)
+            return html
+
+        return None
+
+    def put(self, key, html):
+        """Cache the HTML rendered for key, evicting the least recently used."""
+
+        self._remember(key, html)
+        if self.folder:
+            with open(self._path(key), 'w') as page:
+                page.write(html)
+            self.written += len(html)
+            if (self.diskSize is None or self.diskSize + self.written > self.maxBytes
+                    or self.written * EVICT_FRACTION > self.maxBytes):
+                self._evict_files()
+
+    def _remember(self, key, html):
+        """Keep html in memory under the size cap, not public."""
+
+        if key in self.pages:
+            self.size -= len(self.pages.pop(key))
+        self.pages[key] = html
+        self.size += len(html)
+        while self.size > self.maxBytes and len(self.pages) > 1:
+            evicted, page = self.pages.popitem(last=False)
+            self.size -= len(page)
+            logging.debug('Render cache evicted: %s', evicted)
+
+    def _evict_files(self):
+        """Remove the least recently used pages on disk above the cap, not public."""
+
+        files = []
+        for path in [osjoin(self.folder, f) for f in listdir(self.folder) if f.endswith('.html')]:
+            try:  # another process may remove the page meanwhile
+                info = stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((info.st_mtime, info.st_size, path))
+        files.sort()
+
+        size = sum(f[1] for f in files)
+        for _, fileSize, path in files[:-1]:
+            if size <= self.maxBytes:
+                break
+            try:
+                remove(path)
+            except FileNotFoundError:
+                pass
+            size -= fileSize
+        self.diskSize, self.written = size, 0
@@ -0,0 +1,106 @@
+"""Statistics accumulated chunk by chunk, without holding the data."""
+import numpy as np
+import pandas as pd
+
+__all__ = ('RunningStatistics', 'RunningCorrelation')
+
+
+DESCRIBE_ROWS = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+
+
+class RunningStatistics(object):
+    """Accumulate count, mean, standard deviation, min and max per column."""
+
+    def __init__(self):
+        """Initialize RunningStatistics with no data."""
+        self.count, self.mean, self.m2 = None, None, None
+        self.min, self.max = None, None
+
+    def update(self, data):
+        """Merge the statistics of a chunk of numeric data (Chan et al.)."""
+
+        count = data.count().astype('float64')
+        mean = data.mean().fillna(0)
+        m2 = ((data - mean) ** 2).sum()
+        minimum, maximum = data.min(), data.max()
+
+        if self.count is None:
+            self.count, self.mean, self.m2 = count, mean, m2
+            self.min, self.max = minimum, maximum
+            return self
+
+        total = self.count.add(count, fill_value=0)
+        delta = mean.sub(self.mean, fill_value=0)
+        ratio = (count / total).fillna(0)
+        self.mean = self.mean.add(delta * ratio, fill_value=0)
+        self.m2 = self.m2.add(m2 + delta ** 2 * self.count * ratio, fill_value=0)
+        self.count = total
+        self.min = pd.concat([self.min, minimum], axis=1).min(axis=1)
+        self.max = pd.concat([self.max, maximum], axis=1).max(axis=1)
+        return self
+
+    @property
+    def std(self):
+        """Sample standard deviation (ddof=1), as pandas computes it."""
+        return np.sqrt(self.m2 / (self.count - 1))
+
+    def describe(self, quartiles=None):
+        """Return a frame shaped like DataFrame.describe().
+
+        quartiles is an optional frame indexed by 0.25, 0.5, 0.75, such as
+        DataFrame.quantile returns; quartile rows are left out without it."""
+
+        mean = self.mean.where(self.count > 0)
+        rows = {'count': self.count, 'mean': mean, 'std': self.std,
+                'min': self.min, 'max': self.max}
+        if quartiles is not None:
+            for q, label in zip([0.25, 0.5, 0.75], ['25%', '50%', '75%']):
+                rows[label] = quartiles.loc[q]
+
+        description = pd.DataFrame(rows).transpose()
+        description = description.reindex([r for r in DESCRIBE_ROWS if r in rows])
+        return description[self.count.index]
+
+
+class RunningCorrelation(object):
+    """Accumulate pairwise sums to compute Pearson correlations by chunks.
+
+    Like DataFrame.corr, each pair of columns only uses the rows where both
+    are present. Values are shifted by the first chunk's means to keep the
+    sums of squares accurate."""
+
+    def __init__(self):
+        """Initialize RunningCorrelation with no data."""
+        self.columns, self.shift = None, None
+        self.n, self.sx, self.sxx, self.sxy = None, None, None, None
+
+    def update(self, data):
+        """Add the sums, sums of squares and cross-products of a chunk."""
+
+        if self.columns is None:
+            self.columns = data.columns
+            self.shift = data.mean().fillna(0).values
+            self.n, self.sx, self.sxx, self.sxy = [np.zeros((len(self.columns),) * 2) for _ in range(4)]
+
+        values = data.reindex(columns=self.columns).values.astype('float64') - self.shift
+        present = ~np.isnan(values)
+        values[~present] = 0
+        present = present.astype('float64')
+
+        self.n += present.T.dot(present)
+        self.sx += values.T.dot(present)  # sx[i, j]: sum of column i where j is present
+        self.sxx += (values ** 2).T.dot(present)
+        self.sxy += values.T.dot(values)
+        return self
+
+    def correlation(self):
+        """Return the Pearson correlation matrix as a DataFrame."""
+
+        n, sx, sxx = self.n, self.sx, self.sxx
+        with np.errstate(divide='ignore', invalid='ignore'):
+            covariance = n * self.sxy - sx * sx.T
+            variance = (n * sxx - sx ** 2) * (n * sxx.T - sx.T ** 2)
+            correlation = covariance / np.sqrt(variance)
+        correlation[n < 2] = np.nan
+
+        return pd.DataFrame(np.clip(correlation, -1, 1), index=self.columns, columns=self.columns)
@@ -0,0 +1,25 @@
+"""Tests of BokehPlot rendering, run when Bokeh is installed."""
+import pytest
+from mLearning.bokehPlot import BokehPlot
+from mLearning.renderCache import RenderCache
+
+pytest.importorskip('bokeh')
+
+
+def line_plot(values, cache):
+    return BokehPlot('same', {'a': dict(x=[0, 1, 2], y=values, bokehType='line')}, cache=cache)
+
+
+def test_build_keeps_lines():
+    plot = line_plot([1, 2, 3], None)
+    lines = {name: dict(line) for name, line in plot.lines.items()}
+    plot.build()
+    assert plot.lines == lines
+
+
+def test_render_after_build_keys_on_data():
+    cache = RenderCache()
+    first, second = line_plot([1, 2, 3], cache), line_plot([7, 8, 9], cache)
+    first.build()
+    second.build()
+    assert first.render() != second.render()
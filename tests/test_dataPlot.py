@@ -0,0 +1,85 @@
+"""Tests of DataPlot loading and cleaning, on a small CSV file."""
+import numpy as np
+import pandas as pd
+import pytest
+from mLearning.dataPlot import DataPlot
+
+
+def raw_rows(names=('Fresh beans', 'corn!', 'Apple'), count=30, seed=0):
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame({'name': np.asarray(names)[np.arange(count) % len(names)],
+                         'year': rng.randint(1990, 2010, count), 'month': rng.randint(1, 13, count),
+                         'vol': rng.randn(count), 'val': rng.rand(count) * 100},
+                        columns=['name', 'year', 'month', 'vol', 'val'])
+
+
+@pytest.fixture
+def plots(tmp_path):
+    dataFile = str(tmp_path / 'data.csv')
+    raw_rows().to_csv(dataFile, index=False)
+    return DataPlot('test', dataFile, False)
+
+
+def test_concatenate_dates(plots):
+    data = pd.DataFrame({'year': [2001, 2000], 'month': [2, 2], 'day': [28, 29]})
+    dates = plots.concatenate_dates(data)['date']
+    assert list(dates) == [pd.Timestamp('2001-02-28'), pd.Timestamp('2000-02-29')]
+
+
+@pytest.mark.parametrize('parts', [{'year': [2001], 'month': [2], 'day': [30]},
+                                   {'year': [2001], 'month': [4], 'day': [31]},
+                                   {'year': [np.nan], 'month': [1]},
+                                   {'year': [2001], 'month': [np.nan]},
+                                   {'year': [2001], 'month': [13]},
+                                   {'year': [1500], 'month': [1]}])
+def test_concatenate_dates_rejects_invalid_dates(plots, parts):
+    with pytest.raises(AssertionError):
+        plots.concatenate_dates(pd.DataFrame(parts))
+
+
+def test_append_keeps_caller_rows(plots):
+    rows = raw_rows(('Fresh beans', 'Date palm'), count=4, seed=1)
+    before = rows.copy()
+    plots.append(rows)
+    pd.testing.assert_frame_equal(rows, before)
+    assert len(plots.data.index) == 34
+    assert plots.staleGroups == {'Fresh_beans', 'Date_palm'}
+
+
+def test_group_codes_follow_sorted_names(plots):
+    assert list(plots.data.index.categories) == ['Apple', 'Fresh_beans', 'corn']
+    assert list(plots.groupIndex.names) == ['Apple', 'Fresh_beans', 'corn']
+    codes = plots.groupIndex.codes
+    assert list(codes[:3]) == [1, 2, 0]  # rows in file order: Fresh beans, corn!, Apple
+
+
+def test_cached_load_matches_fresh_load(tmp_path):
+    pytest.importorskip('pyarrow')
+    dataFile = str(tmp_path / 'data.csv')
+    raw_rows().to_csv(dataFile, index=False)
+    cacheFolder = str(tmp_path / 'cache')
+    fresh = DataPlot('test', dataFile, False, cacheFolder=cacheFolder)
+    cached = DataPlot('test', dataFile, False, cacheFolder=cacheFolder)
+    pd.testing.assert_frame_equal(cached.description, fresh.description)
+    pd.testing.assert_frame_equal(cached.numericData, fresh.numericData)
+
+
+def test_transpose_index_serves_cached_groups(tmp_path):
+    pytest.importorskip('bokeh')
+    pytest.importorskip('pathos')
+    from mLearning.renderCache import RenderCache
+    dataFile = str(tmp_path / 'data.csv')
+    raw_rows().to_csv(dataFile, index=False)
+    plots = DataPlot('test', dataFile, False, renderCache=RenderCache())
+    first = plots.transpose_index(workers=1)
+    assert len(plots.renderCache.pages) == 3
+    assert plots.transpose_index(workers=1) == first
+
+
+def test_compact_data_keeps_precision(plots):
+    data = pd.DataFrame({'large': [123456789.123, 1.5], 'cents': [1234567.89, 2.25],
+                         'halves': [12.5, -3.0], 'small': [0.25, np.nan], 'full': [np.pi, np.e],
+                         'huge': [1e300, 1.0]})
+    dtypes = plots.compact_data(data).dtypes
+    assert dict(dtypes.astype(str)) == {'large': 'float64', 'cents': 'float64', 'halves': 'float32',
+                                        'small': 'float32', 'full': 'float64', 'huge': 'float64'}
@@ -0,0 +1,58 @@
+"""Tests of the downsampling helpers and of the BokehPlot point budget."""
+import numpy as np
+import pytest
+from mLearning.bokehPlot import BokehPlot, MIN_LINE_POINTS
+from mLearning.downsample import lttb_indices, minmax_indices, spread_indices
+
+
+def series(length=1000, seed=0):
+    rng = np.random.RandomState(seed)
+    return np.arange(length, dtype='float64'), rng.normal(0, 1, length).cumsum()
+
+
+@pytest.mark.parametrize('method', [lttb_indices, minmax_indices])
+@pytest.mark.parametrize('threshold', [0, 1, 2, 3, 4, 5, 10, 99, 1000, 2000])
+def test_threshold_caps_points(method, threshold):
+    x, y = series()
+    kept = method(x, y, threshold)
+    assert len(kept) <= max(threshold, 1)
+    assert np.all(np.diff(kept) > 0)  # sorted, no duplicates
+    if threshold >= 2:
+        assert kept[0] == 0 and kept[-1] == len(y) - 1
+
+
+def test_minmax_keeps_extremes():
+    x, y = series()
+    kept = minmax_indices(x, y, 100)
+    assert np.argmin(y) in kept and np.argmax(y) in kept
+
+
+def test_lttb_keeps_a_spike():
+    x, y = np.arange(100.0), np.zeros(100)
+    y[37] = 10
+    assert 37 in lttb_indices(x, y, 10)
+
+
+def test_spread_indices():
+    assert list(spread_indices(5, 10)) == [0, 1, 2, 3, 4]
+    assert list(spread_indices(101, 3)) == [0, 50, 100]
+
+
+@pytest.mark.parametrize('downsampling', ['lttb', 'minmax'])
+@pytest.mark.parametrize('maxPoints', [5, 15, 25, 200, 5000])
+def test_line_budget_is_a_hard_cap(downsampling, maxPoints):
+    x, y = series(100)
+    lines = {'l{}'.format(i): dict(x=x, y=y, bokehType='line') for i in range(10)}
+    plot = BokehPlot('budget', lines, maxPoints=maxPoints, downsampling=downsampling)
+    budget = plot.line_budget()
+    total = sum(len(plot._downsample('line', [x, y], budget)[1]) for _ in lines)
+    assert total <= max(maxPoints, MIN_LINE_POINTS * len(lines))
+
+
+@pytest.mark.parametrize('maxPoints', [1, 5, 15, 25, 40, 5000])
+def test_multi_line_budget_is_a_hard_cap(maxPoints):
+    xs, ys = [np.arange(10.0)] * 4, [series(10, seed)[1] for seed in range(4)]
+    plot = BokehPlot('budget', {'l': dict(x=xs, y=ys, bokehType='multi_line')}, maxPoints=maxPoints)
+    xs, ys = plot._downsample('multi_line', [xs, ys], plot.line_budget())
+    assert len(xs) == len(ys)
+    assert sum(len(y) for y in ys) <= max(maxPoints, MIN_LINE_POINTS)
@@ -0,0 +1,30 @@
+"""Tests of GroupIndex against pandas groupby."""
+import numpy as np
+import pandas as pd
+from mLearning.groupIndex import GroupIndex
+
+
+def test_positions_match_groupby():
+    index = pd.Index(['b', 'a', None, 'c', 'a', 'b', 'a'])
+    groups = GroupIndex(index)
+    assert list(groups.names) == ['a', 'b', 'c']
+    expected = pd.Series(np.arange(len(index)), index=index).groupby(level=0).indices
+    for name in groups.names:
+        assert list(groups.positions(name)) == list(expected[name])
+
+
+def test_extend():
+    groups = GroupIndex(pd.Index(['b', 'a', 'b']))
+    touched = groups.extend(pd.Index(['c', 'a', None]))
+    assert touched == {'c', 'a'}
+    assert list(groups.names) == ['a', 'b', 'c']
+    assert list(groups.positions('a')) == [1, 4]
+    assert list(groups.positions('b')) == [0, 2]
+    assert list(groups.positions('c')) == [3]
+    assert len(groups) == 3
+
+
+def test_take_and_groups():
+    data = pd.DataFrame({'v': range(4)}, index=pd.Index(['x', 'y', 'x', 'y']))
+    groups = dict((name, list(rows['v'])) for name, rows in GroupIndex(data.index).groups(data))
+    assert groups == {'x': [0, 2], 'y': [1, 3]}
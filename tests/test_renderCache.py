@@ -0,0 +1,32 @@
+"""Tests of RenderCache, in memory and on disk."""
+import multiprocessing
+import os
+from mLearning.renderCache import RenderCache, content_key
+
+
+def test_memory_cap():
+    cache = RenderCache(maxBytes=10)
+    cache.put('a', 'x' * 6)
+    cache.put('b', 'y' * 6)
+    assert cache.get('a') is None and cache.get('b') == 'y' * 6
+
+
+def test_folder_survives_the_process(tmp_path):
+    RenderCache(folder=str(tmp_path)).put('a', '<html>')
+    assert RenderCache(folder=str(tmp_path)).get('a') == '<html>'
+
+
+def put_pages(folder, worker):
+    cache = RenderCache(maxBytes=2000, folder=folder)
+    for i in range(200):
+        cache.put(content_key(worker, i), 'x' * 100)
+        cache.get(content_key(worker, i - 5))
+    return True
+
+
+def test_folder_shared_by_processes(tmp_path):
+    folder = str(tmp_path)
+    with multiprocessing.Pool(4) as pool:
+        assert all(pool.starmap(put_pages, [(folder, worker) for worker in range(4)]))
+    size = sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder))
+    assert size <= 2000 + 4 * 2000 // 16 + 4 * 100
@@ -0,0 +1,47 @@
+"""Tests of the running statistics against their pandas counterparts."""
+import numpy as np
+import pandas as pd
+import pytest
+from mLearning.runningStats import RunningStatistics, RunningCorrelation
+
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(0)
+    data = pd.DataFrame({'a': rng.normal(1e6, 1, 1000), 'b': rng.lognormal(0, 2, 1000),
+                         'c': rng.randn(1000)})
+    data.loc[rng.rand(1000) < 0.2, 'b'] = np.nan  # rows missing b
+    data.loc[:99, 'c'] = np.nan  # a whole chunk missing c
+    return data
+
+
+def chunks(data, size=100):
+    return [data.iloc[i:i + size] for i in range(0, len(data.index), size)]
+
+
+def test_statistics_match_describe(data):
+    statistics = RunningStatistics()
+    for chunk in chunks(data):
+        statistics.update(chunk)
+    quartiles = data.quantile([0.25, 0.5, 0.75])
+    pd.testing.assert_frame_equal(statistics.describe(quartiles), data.describe(), rtol=1e-9)
+
+
+def test_statistics_single_update(data):
+    description = RunningStatistics().update(data).describe()
+    expected = data.describe().loc[description.index]
+    pd.testing.assert_frame_equal(description, expected, rtol=1e-9)
+
+
+def test_correlation_matches_corr(data):
+    correlation = RunningCorrelation()
+    for chunk in chunks(data, 64):
+        correlation.update(chunk)
+    pd.testing.assert_frame_equal(correlation.correlation(), data.corr(), rtol=1e-9, atol=1e-12)
+
+
+def test_correlation_without_enough_pairs():
+    data = pd.DataFrame({'a': [1.0, 2.0, 3.0], 'b': [np.nan, np.nan, 1.0]})
+    correlation = RunningCorrelation().update(data).correlation()
+    assert correlation.loc['a', 'a'] == 1
+    assert np.isnan(correlation.loc['a', 'b']) and np.isnan(correlation.loc['b', 'b'])